@@ -0,0 +1,451 @@
+import os
+import sys
+import json
+import time
+import fnmatch
+import argparse
+import platform
+import tempfile
+import contextlib
+import tracemalloc
+import numpy as np
+
+"""
+Benchmark suite for the DDSOverlay driver stack.
+Runs against real hardware (--backend hw) or against sim_backend off-board
+(--backend sim, the default). On hardware the DMA frame shape is fixed by the
+bitstream, so cases needing a different layout are skipped (measure_phase
+needs a two-channel frame, sfdr_dBc/sinad_dBc/dma a one-channel one).
+Writes the results to a JSON file and compares them against a JSON baseline,
+flagging any metric that got worse by more than --threshold (relative).
+
+    python benchmark.py --save-baseline             # record a new baseline
+    python benchmark.py                             # compare against it
+    python benchmark.py --backend hw --bitfile hw/top.bit --only 'setter/*'
+"""
+
+this_dir = os.path.dirname(os.path.abspath(__file__))
+
+# direction of improvement for each metric that can be recorded
+METRICS = {
+    'time_s': 'lower',
+    'peak_mem_MiB': 'lower',
+    'words_per_s': 'higher',
+    'samples_per_s': 'higher',
+}
+
+# below this many repetitions the median is too noisy to compare against a
+# fixed threshold, so the fastest run is used as time_s instead
+MIN_REPEAT_FOR_MEDIAN = 10
+
+# DMA buffer sizes (samples) benchmarked with the sim backend
+SIM_BUFFER_SIZES = [2**16, 2**18, 2**20]
+
+def load_overlay(backend, bitfile_name=None):
+    if backend == 'sim':
+        import sim_backend
+        sim_backend.install()
+    elif backend != 'hw':
+        raise ValueError(f"invalid choice of backend: {backend}, please choose one of 'sim' or 'hw'")
+    from dds_loopback import DDSOverlay
+    ol = DDSOverlay(bitfile_name=bitfile_name)
+    ol.dbg = False
+    ol.plot = False
+    return ol
+
+def set_frame_shape(ol, shape, n_buffers=1):
+    """
+    Reallocates the DMA buffers of the overlay with a new frame shape
+    """
+    from pynq import allocate
+    del ol.dma_buffers
+    ol.dma_frame_shape = shape
+    ol.dma_frame_size = int(np.prod(shape))
+    ol.dma_buffers = [allocate(shape=shape, dtype=np.int16) for i in range(n_buffers)]
+
+class _NoSleepTime:
+    """
+    Stand-in for the time module that turns time.sleep into a no-op
+    """
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+    def sleep(self, secs):
+        pass
+
+@contextlib.contextmanager
+def no_sleep():
+    """
+    Removes the fixed time.sleep calls in dds_loopback for the duration of the
+    block; even time.sleep(0) costs tens of microseconds, more than the
+    register writes the setters make
+    """
+    import dds_loopback
+    try:
+        dds_loopback.time = _NoSleepTime()
+        yield
+    finally:
+        dds_loopback.time = time
+
+def frame_shapes(native_shape, buffer_sizes, two_channel=False):
+    """
+    Returns the DMA frame shapes to benchmark at.
+    buffer_sizes is None on hardware: the sample buffer in the PL captures a
+    fixed number of samples, so only the bitstream's own frame shape is usable,
+    and only if it has the layout (one or two channels) the case needs.
+    """
+    if buffer_sizes is None:
+        if (len(native_shape) == 2) != two_channel:
+            return []
+        return [native_shape]
+    return [(n//2, 2) if two_channel else (n,) for n in buffer_sizes]
+
+def measure(func, repeat, memory=False, setup=None):
+    """
+    Calls func repeat times and returns the median wall-clock time as time_s,
+    or the minimum if there are fewer than MIN_REPEAT_FOR_MEDIAN repetitions.
+    setup (if given) is called before each call to func, outside the timed region.
+    If memory is True, func is called once more under tracemalloc to get the
+    peak allocation (numpy buffers are tracked as well).
+    """
+    times = []
+    for i in range(repeat):
+        if setup is not None:
+            setup()
+        t1 = time.perf_counter()
+        func()
+        t2 = time.perf_counter()
+        times.append(t2 - t1)
+    result = {
+        'time_median_s': float(np.median(times)),
+        'time_min_s': min(times),
+        'repeat': repeat,
+    }
+    if repeat >= MIN_REPEAT_FOR_MEDIAN:
+        result['time_s'] = result['time_median_s']
+    else:
+        result['time_s'] = result['time_min_s']
+    if memory:
+        if setup is not None:
+            setup()
+        tracemalloc.start()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result['peak_mem_MiB'] = peak / 2**20
+    return result
+
+def bench_send_tx_pkt(ol, repeat, packet_sizes=(1, 16, 256)):
+    # channel 1 is unused by the loopback measurements
+    fifo = ol.pinc[1]
+    for num_words in packet_sizes:
+        for kind, data in [('list', [0]*num_words), ('bytes', bytes(4*num_words))]:
+            def case(data=data, num_words=num_words):
+                result = measure(lambda: fifo.send_tx_pkt(data), repeat)
+                result['words_per_s'] = num_words / result['time_s']
+                return result
+            yield f'send_tx_pkt/{kind}/words={num_words}', case
+
+def bench_setters(ol, repeat):
+    setters = {
+        'set_freq_hz': lambda: ol.set_freq_hz(200e6),
+        'set_dac_atten_dB': lambda: ol.set_dac_atten_dB(12),
+        'set_vga_atten_dB': lambda: ol.set_vga_atten_dB(18),
+        'set_adc_source': lambda: ol.set_adc_source('afe'),
+        'set_sample_buffer_trigger_source': lambda: ol.set_sample_buffer_trigger_source('manual'),
+        'manual_trigger': ol.manual_trigger,
+    }
+    def case(setter):
+        # every setter ends with time.sleep(ol.t_sleep), which would swamp the
+        # register path; compare the latency without it and only record the full one
+        with no_sleep():
+            result = measure(setter, repeat)
+        result['time_with_sleep_s'] = measure(setter, repeat)['time_s']
+        return result
+    for name, setter in setters.items():
+        yield f'setter/{name}', lambda setter=setter: case(setter)
+
+def bench_capture(ol, repeat, shapes):
+    # only the DMA transfer is timed; dma() and capture_data() add fixed sleeps
+    # around it, and transfer() alone returns before the data has arrived
+    def transfer():
+        t1 = ol.timer.read_count()
+        ol.dma_recv.transfer(ol.dma_buffers[0])
+        ol.dma_recv.wait()
+        t2 = ol.timer.read_count()
+        timer_s.append(ol.timer.time_it(t1, t2))
+    timer_s = []
+    for shape in shapes:
+        n = int(np.prod(shape))
+        def case(n=n, shape=shape):
+            set_frame_shape(ol, shape)
+            ol.set_sample_buffer_trigger_source('manual')
+            ol.set_freq_hz(200e6)
+            timer_s.clear()
+            result = measure(transfer, repeat, setup=ol.manual_trigger)
+            result['samples_per_s'] = n / result['time_s']
+            # the same transfers timed with the AXI timer, as capture_data() does
+            result['timer_time_s'] = float(np.median(timer_s))
+            return result
+        yield f'dma/n={n}', case
+
+def bench_analysis(ol, repeat, shapes):
+    for shape in shapes:
+        n = int(np.prod(shape))
+        for name in ['sfdr_dBc', 'sinad_dBc']:
+            def case(n=n, shape=shape, func=getattr(ol, name)):
+                set_frame_shape(ol, shape)
+                ol.set_sample_buffer_trigger_source('manual')
+                ol.set_adc_source('afe')
+                ol.set_vga_atten_dB(18)
+                ol.set_dac_atten_dB(12)
+                ol.set_freq_hz(239e6)
+                ol.manual_trigger()
+                ol.dma(0)
+                result = measure(lambda: func(0), repeat, memory=True)
+                result['samples_per_s'] = n / result['time_s']
+                return result
+            yield f'{name}/n={n}', case
+
+def bench_measure_phase(ol, repeat, shapes, osrs, sleeps):
+    """
+    shapes are two-channel (analog, digital) frames, the layout measure_phase expects.
+    Timed inside the sleeps context: no_sleep on the sim backend, while on
+    hardware the setter and dma() sleeps are kept (they avoid AXI reordering),
+    so there time_s includes about 72 ms of fixed sleep.
+    """
+    tones = np.floor((np.array([20e6, 30e6])/ol.f_samp)*2**ol.phase_bits)*ol.f_samp/2**ol.phase_bits
+    for shape in shapes:
+        n = int(np.prod(shape))
+        for OSR in osrs:
+            def case(shape=shape, OSR=OSR):
+                set_frame_shape(ol, shape)
+                with sleeps():
+                    return measure(lambda: ol.measure_phase('afe', tones, OSR, 18, 12), repeat, memory=True)
+            yield f'measure_phase/n={n}/OSR={OSR}', case
+
+def bench_freq_sweep(ol, repeat, native_shape, n_freqs, sleeps):
+    # same as measure_phase, the fixed sleeps are only kept on hardware
+    def case():
+        set_frame_shape(ol, native_shape)
+        freqs = np.linspace(10e6, 1900e6, n_freqs)
+        with tempfile.TemporaryDirectory() as tmp:
+            name = os.path.join(tmp, 'sweep.mat')
+            with sleeps():
+                result = measure(lambda: ol.do_freq_sweep(name, 12, 18, freqs), repeat, memory=True)
+        result['samples_per_s'] = n_freqs*ol.dma_frame_size / result['time_s']
+        return result
+    yield f'do_freq_sweep/n_freqs={n_freqs}', case
+
+def run(ol, repeat, buffer_sizes, osrs, n_freqs, pattern='*', hw=False):
+    """
+    Runs every benchmark whose name matches pattern; buffer_sizes is None to
+    only use the overlay's own DMA frame shape (required on hardware).
+    With hw False the end-to-end cases are timed without the fixed sleeps.
+    """
+    sleeps = contextlib.nullcontext if hw else no_sleep
+    native_shape = tuple(ol.dma_frame_shape)
+    one_channel = frame_shapes(native_shape, buffer_sizes)
+    two_channel = frame_shapes(native_shape, buffer_sizes, two_channel=True)
+    if not one_channel:
+        print(f'skipping dma, sfdr_dBc and sinad_dBc: frame shape {native_shape} is not one-channel')
+    if not two_channel:
+        print(f'skipping measure_phase: frame shape {native_shape} is not two-channel')
+    suites = [
+        bench_send_tx_pkt(ol, repeat),
+        bench_setters(ol, repeat),
+        bench_capture(ol, repeat, one_channel),
+        bench_analysis(ol, repeat, one_channel),
+        # these are slow, so they get fewer repetitions and are compared on the fastest run
+        bench_measure_phase(ol, max(3, repeat//4), two_channel, osrs, sleeps),
+        bench_freq_sweep(ol, 3, native_shape, n_freqs, sleeps),
+    ]
+    results = {}
+    failed = []
+    for suite in suites:
+        for name, case in suite:
+            if not fnmatch.fnmatch(name, pattern):
+                continue
+            try:
+                result = case()
+            except Exception as e:
+                # keep going so the other cases still get measured, but record the failure
+                print(f'{name}: error: {type(e).__name__}: {e}')
+                failed.append(name)
+                continue
+            results[name] = result
+            metrics = ', '.join(f'{m} = {result[m]:.4g}' for m in METRICS if m in result)
+            print(f'{name}: {metrics}')
+    return results, failed
+
+def compare(results, baseline, threshold):
+    """
+    Returns a list of (name, metric, baseline value, new value, relative change)
+    for every metric that got worse by more than threshold.
+    For cases with fewer than MIN_REPEAT_FOR_MEDIAN repetitions the timing
+    metrics also get the relative spread (median vs. fastest) of the baseline
+    added to the threshold.
+    If the two runs used a different number of repetitions, time_s may be a
+    different statistic in each, so the timing metrics are compared using
+    whichever of the median or fastest run the baseline used.
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        spread = 0
+        old_result = baseline[name]
+        if old_result.get('repeat', MIN_REPEAT_FOR_MEDIAN) < MIN_REPEAT_FOR_MEDIAN and 'time_median_s' in old_result:
+            spread = (old_result['time_median_s'] - old_result['time_min_s']) / old_result['time_min_s']
+        # timing metrics are rescaled from time_s to the statistic the baseline used
+        rescale = 1
+        if result.get('repeat') != old_result.get('repeat') and 'time_median_s' in result:
+            stat = 'time_median_s' if old_result.get('repeat', MIN_REPEAT_FOR_MEDIAN) >= MIN_REPEAT_FOR_MEDIAN else 'time_min_s'
+            rescale = result[stat] / result['time_s']
+            print(f"warning: {name} ran {result.get('repeat')} times, baseline {old_result.get('repeat')}; comparing {stat}")
+        for metric, better in METRICS.items():
+            if metric not in result or metric not in old_result:
+                continue
+            old = old_result[metric]
+            new = result[metric]
+            if metric == 'time_s':
+                new *= rescale
+            elif metric != 'peak_mem_MiB':
+                new /= rescale
+            if old == 0:
+                continue
+            change = (new - old) / old
+            limit = threshold if metric == 'peak_mem_MiB' else threshold + spread
+            if (better == 'lower' and change > limit) or (better == 'higher' and change < -limit):
+                regressions.append((name, metric, old, new, change))
+    return regressions
+
+def self_check(repeat, threshold):
+    """
+    Checks on the sim backend that doubling the cost of every register access
+    and GPIO toggle is reported as a regression of the setter and send_tx_pkt
+    benchmarks. Returns the names of the cases that weren't flagged.
+    """
+    import sim_backend
+    # enough repetitions that time_s is a median and no spread allowance applies
+    repeat = max(repeat, 2*MIN_REPEAT_FOR_MEDIAN)
+    ol = load_overlay('sim')
+    # send_tx_pkt/* and setter/*
+    pattern = 'se[nt]*'
+    baseline, _ = run(ol, repeat, None, [], 0, pattern)
+    def doubled(func):
+        # spin for as long as the access itself took
+        def slow(*args):
+            t1 = time.perf_counter()
+            value = func(*args)
+            t2 = time.perf_counter()
+            while time.perf_counter() < 2*t2 - t1:
+                pass
+            return value
+        return slow
+    patched = [(sim_backend.DefaultIP, 'read'), (sim_backend.DefaultIP, 'write'),
+               (sim_backend.GPIO, 'on'), (sim_backend.GPIO, 'off')]
+    originals = [getattr(cls, attr) for cls, attr in patched]
+    try:
+        for (cls, attr), func in zip(patched, originals):
+            setattr(cls, attr, doubled(func))
+        results, _ = run(ol, repeat, None, [], 0, pattern)
+    finally:
+        for (cls, attr), func in zip(patched, originals):
+            setattr(cls, attr, func)
+    flagged = {name for name, metric, old, new, change in compare(results, baseline, threshold)}
+    return [name for name in results if name not in flagged]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='benchmark the DDSOverlay driver stack')
+    parser.add_argument('--backend', default='sim', choices=['sim', 'hw'])
+    parser.add_argument('--bitfile', default=None, help='bitfile to load (hw backend only)')
+    parser.add_argument('--baseline', default=None, help='baseline JSON (default benchmarks/baseline_<backend>.json)')
+    parser.add_argument('--save-baseline', action='store_true', help='overwrite the baseline with this run')
+    parser.add_argument('--output', default=None, help='also write the results of this run to this JSON file')
+    parser.add_argument('--threshold', type=float, default=0.1, help='relative change that counts as a regression')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--buffer-sizes', type=int, nargs='+', default=None,
+                        help=f'DMA buffer sizes in samples (sim backend only, default {SIM_BUFFER_SIZES})')
+    parser.add_argument('--osr', type=int, nargs='+', default=[64, 256, 1024])
+    parser.add_argument('--n-freqs', type=int, default=16)
+    parser.add_argument('--only', default='*', help='glob pattern of benchmark names to run')
+    parser.add_argument('--self-check', action='store_true',
+                        help='check that a 2x slower register path on the sim backend is flagged, then exit')
+    args = parser.parse_args(argv)
+
+    if args.self_check:
+        missed = self_check(args.repeat, args.threshold)
+        for name in missed:
+            print(f'NOT FLAGGED {name}')
+        if missed:
+            print(f'self-check failed: {len(missed)} cases with a 2x slower register path were not flagged')
+            return 1
+        print('self-check passed: 2x slower register path flagged in every setter and send_tx_pkt case')
+        return 0
+
+    if args.backend == 'hw':
+        # the sample buffer in the PL has a fixed capture length, so the DMA
+        # buffers can't be resized without hanging or erroring the transfer
+        if args.buffer_sizes is not None:
+            parser.error('--buffer-sizes is not supported with --backend hw, the bitstream fixes the frame size')
+    elif args.buffer_sizes is None:
+        args.buffer_sizes = SIM_BUFFER_SIZES
+
+    if args.baseline is None:
+        args.baseline = os.path.join(this_dir, 'benchmarks', f'baseline_{args.backend}.json')
+
+    ol = load_overlay(args.backend, args.bitfile)
+    results, failed = run(ol, args.repeat, args.buffer_sizes, args.osr, args.n_freqs, args.only, args.backend == 'hw')
+    report = {
+        'backend': args.backend,
+        'host': platform.node(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': results,
+    }
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    for name in failed:
+        print(f'FAILED {name}')
+
+    if args.save_baseline:
+        if failed:
+            print(f'{len(failed)} benchmarks failed, not saving baseline')
+            return 1
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        # keep baseline entries for benchmarks that weren't run this time
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                old = json.load(f)
+            report['results'] = {**old['results'], **results}
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'saved baseline to {args.baseline}')
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f'no baseline at {args.baseline}, rerun with --save-baseline to create one')
+        return 1 if failed else 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline['backend'] != args.backend:
+        raise ValueError(f"baseline was recorded with backend {baseline['backend']}, not {args.backend}")
+    regressions = compare(results, baseline['results'], args.threshold)
+    for name, metric, old, new, change in regressions:
+        print(f'REGRESSION {name} {metric}: {old:.4g} -> {new:.4g} ({change*100:+.1f}%)')
+    # baseline entries selected by --only that this run didn't produce a result for
+    missing = [name for name in baseline['results'] if fnmatch.fnmatch(name, args.only) and name not in results and name not in failed]
+    for name in missing:
+        print(f'MISSING {name} (in baseline, not measured in this run)')
+    if regressions or failed or missing:
+        print(f'{len(regressions)} regressions beyond {args.threshold*100:.0f}%, {len(failed)} failed, {len(missing)} missing')
+        return 1
+    print(f'no regressions beyond {args.threshold*100:.0f}% against {args.baseline}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
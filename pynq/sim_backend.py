@@ -0,0 +1,257 @@
+import sys
+import time
+import types
+import collections
+import numpy as np
+
+"""
+Simulated stand-in for the board-only python packages (pynq, xrfclk, serial)
+so that DDSOverlay and its drivers can be exercised off-board.
+Call install() before importing dds_loopback/axitxfifo/axitimer; the real
+driver classes are then built on top of the simulated DefaultIP, so their
+register-level code runs unmodified against a model of the DDS loopback design.
+"""
+
+# AXI-Stream FIFO (axi_fifo_mm_s) register offsets
+FIFO_REGISTERS = {
+    'ISR': 0x00, 'IER': 0x04, 'TDFR': 0x08, 'TDFV': 0x0C, 'TDFD': 0x10,
+    'TLR': 0x14, 'RDFR': 0x18, 'RDFO': 0x1C, 'RDFD': 0x20, 'RLR': 0x24,
+    'SRR': 0x28, 'TDR': 0x2C, 'RDR': 0x30,
+}
+# AXI timer register offsets (timer 0 only)
+TIMER_REGISTERS = {'TCSR0': 0x00, 'TLR0': 0x04, 'TCR0': 0x08}
+
+class Register:
+    def __init__(self, address):
+        self.address = address
+
+class RegisterMap:
+    def __init__(self, registers):
+        for name, address in registers.items():
+            setattr(self, name, Register(address))
+
+class DefaultIP:
+    """
+    Simulated pynq.DefaultIP; register accesses are forwarded to the model
+    object passed in through the description
+    """
+    def __init__(self, description):
+        self.description = description
+        self.register_map = RegisterMap(description['registers'])
+        self._model = description['model']
+
+    def read(self, offset=0):
+        return self._model.read(offset)
+
+    def write(self, offset, value):
+        self._model.write(offset, value)
+
+class Clocks:
+    fclk0_mhz = 100.0
+
+def allocate(shape, dtype):
+    return np.zeros(shape, dtype=dtype)
+
+class FifoModel:
+    """
+    TX side of an AXI-Stream FIFO; each packet is handed to on_packet as soon
+    as its length is written to TLR, so the FIFO drains instantly
+    """
+    def __init__(self, on_packet, depth=512):
+        self.on_packet = on_packet
+        self.depth = depth
+        self.words = []
+
+    def read(self, offset):
+        if offset == FIFO_REGISTERS['TDFV']:
+            # vacancy is reported as depth - 4
+            return self.depth - 4 - len(self.words)
+        return 0
+
+    def write(self, offset, value):
+        if offset == FIFO_REGISTERS['TDFD']:
+            if type(value) is bytes:
+                self.words.extend(np.frombuffer(value[:len(value) & ~3], dtype=np.uint32).tolist())
+            else:
+                self.words.append(value)
+        elif offset == FIFO_REGISTERS['TLR']:
+            num_words = value >> 2
+            packet = self.words[:num_words]
+            del self.words[:num_words]
+            self.on_packet(packet)
+
+class TimerModel:
+    """
+    Free-running counter derived from the host clock at fclk0
+    """
+    def __init__(self):
+        self.regs = {}
+
+    def read(self, offset):
+        if offset == TIMER_REGISTERS['TCR0']:
+            return int(time.perf_counter_ns() * Clocks.fclk0_mhz / 1e3) & 0xffffffff
+        return self.regs.get(offset, 0)
+
+    def write(self, offset, value):
+        self.regs[offset] = value
+
+class GPIO:
+    def __init__(self, on_change):
+        self.on_change = on_change
+
+    def on(self):
+        self.on_change(True)
+
+    def off(self):
+        self.on_change(False)
+
+class DMAChannel:
+    def __init__(self, loopback):
+        self.loopback = loopback
+
+    def transfer(self, buffer):
+        self.loopback.capture(buffer)
+
+    def wait(self):
+        pass
+
+class LoopbackModel:
+    """
+    Model of the DDS -> (AFE | balun) -> ADC loopback.
+    1-D buffers receive the selected ADC channel, (N, 2) buffers receive
+    the (inverted) analog channel in column 0 and the digital DDS output in
+    column 1, matching the layouts DDSOverlay expects.
+    Waveforms are synthesized once per configuration and copied into the DMA
+    buffer on every capture, so the cost of the model itself doesn't show up
+    in driver benchmarks (the noise is the same realization for every capture
+    of a configuration).
+    """
+    def __init__(self, f_samp=4.096e9, phase_bits=24, seed=0):
+        self.f_samp = f_samp
+        self.phase_bits = phase_bits
+        self.pinc = [0, 0]
+        self.scale = [0, 0]
+        self.vga_atten_dB = [0, 0]
+        self.adc_source = 'afe'
+        self.trigger_mode = 'manual'
+        # analog channel delay through the AFE in samples
+        self.delay_samples = 300.3
+        # number of samples captured before a dds_auto trigger
+        self.pretrigger_samples = 1536
+        self.noise_lsb = 4.0
+        self.hd2_dBc = -65
+        self.hd3_dBc = -70
+        self.transition = None
+        self.rng = np.random.default_rng(seed)
+        self.max_cached_waveforms = 32
+        self.waveforms = collections.OrderedDict()
+
+    def set_pinc(self, channel, packet):
+        if not packet:
+            return
+        if channel == 0 and self.trigger_mode == 'dds_auto':
+            self.transition = (self.pinc[0], packet[-1])
+        self.pinc[channel] = packet[-1]
+
+    def set_scale(self, channel, packet):
+        if packet:
+            self.scale[channel] = packet[-1]
+
+    def lmh6401_packet(self, packet):
+        for word in packet:
+            if (word >> 8) & 0xff == 0x02:
+                self.vga_atten_dB[(word >> 16) & 0x1] = word & 0x3f
+
+    def set_adc_source(self, balun):
+        self.adc_source = 'balun' if balun else 'afe'
+
+    def set_trigger_mode(self, dds_auto):
+        self.trigger_mode = 'dds_auto' if dds_auto else 'manual'
+        self.transition = None
+
+    def manual_trigger(self, value):
+        if value:
+            self.transition = None
+
+    def _phase(self, t):
+        # phase-continuous DDS output, with an optional frequency step at the trigger
+        f0 = self.pinc[0] / 2**self.phase_bits
+        if self.transition is None:
+            return 2*np.pi*f0*t
+        f0, f1 = (p / 2**self.phase_bits for p in self.transition)
+        n_trig = self.pretrigger_samples
+        return 2*np.pi*np.where(t < n_trig, f0*t, f0*n_trig + f1*(t - n_trig))
+
+    def capture(self, buffer):
+        key = (buffer.shape, self.pinc[0], self.scale[0], self.vga_atten_dB[0], self.adc_source, self.transition)
+        if key not in self.waveforms:
+            self.waveforms[key] = self._synthesize(buffer.shape)
+            if len(self.waveforms) > self.max_cached_waveforms:
+                self.waveforms.popitem(last=False)
+        buffer[:] = self.waveforms[key]
+
+    def _synthesize(self, shape):
+        n = shape[0]
+        t = np.arange(n, dtype=np.float64)
+        amplitude = (2**15 - 1) / 2**self.scale[0]
+        digital = amplitude*np.cos(self._phase(t))
+        phase = self._phase(t - self.delay_samples)
+        if self.adc_source == 'afe':
+            gain = 10**((6 - self.vga_atten_dB[0])/20)
+        else:
+            gain = 0.5
+        analog = np.cos(phase)
+        analog += 10**(self.hd2_dBc/20)*np.cos(2*phase) + 10**(self.hd3_dBc/20)*np.cos(3*phase)
+        analog *= -gain*amplitude
+        analog += self.rng.normal(scale=self.noise_lsb, size=n)
+        analog = np.clip(np.round(analog), -2**15, 2**15 - 1)
+        waveform = np.zeros(shape, dtype=np.int16)
+        if len(shape) == 1:
+            waveform[:] = analog
+        else:
+            waveform[:,0] = analog
+            waveform[:,1] = np.round(digital)
+        return waveform
+
+class Overlay:
+    """
+    Simulated pynq.Overlay exposing the IP hierarchy of the DDS loopback design
+    """
+    def __init__(self, bitfile_name, download=True, **kwargs):
+        from axitimer import AxiTimerDriver
+        from axitxfifo import AxiStreamFifoDriver
+        self.bitfile_name = bitfile_name
+        self.loopback = LoopbackModel()
+        lb = self.loopback
+        def fifo(on_packet):
+            return AxiStreamFifoDriver({'registers': FIFO_REGISTERS, 'model': FifoModel(on_packet)})
+        self.axi_dma_0 = types.SimpleNamespace(recvchannel=DMAChannel(lb))
+        self.dds_hier_0 = types.SimpleNamespace(
+            axi_fifo_pinc_0=fifo(lambda p: lb.set_pinc(0, p)),
+            axi_fifo_scale_0=fifo(lambda p: lb.set_scale(0, p)),
+        )
+        self.dds_hier_1 = types.SimpleNamespace(
+            axi_fifo_pinc_1=fifo(lambda p: lb.set_pinc(1, p)),
+            axi_fifo_scale_1=fifo(lambda p: lb.set_scale(1, p)),
+        )
+        self.axi_timer_0 = AxiTimerDriver({'registers': TIMER_REGISTERS, 'model': TimerModel()})
+        self.lmh6401_hier = types.SimpleNamespace(axi_fifo_lmh6401=fifo(lb.lmh6401_packet))
+        self.adc_select = GPIO(lb.set_adc_source)
+        self.trigger_mode = GPIO(lb.set_trigger_mode)
+        self.capture_trig = GPIO(lb.manual_trigger)
+
+def install():
+    """
+    Registers the simulated pynq, xrfclk and serial modules in sys.modules
+    """
+    pynq = types.ModuleType('pynq')
+    pynq.DefaultIP = DefaultIP
+    pynq.Overlay = Overlay
+    pynq.allocate = allocate
+    pynq.Clocks = Clocks
+    xrfclk = types.ModuleType('xrfclk')
+    xrfclk.set_ref_clks = lambda lmk_freq=None, lmx_freq=None: None
+    serial = types.ModuleType('serial')
+    sys.modules['pynq'] = pynq
+    sys.modules['xrfclk'] = xrfclk
+    sys.modules['serial'] = serial